@@ -38,135 +38,349 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import os
+import sys
+import mmap
 import signal
 import argparse
 import pathlib
+import stat
+from collections.abc import Callable
 from dataclasses import dataclass
+from functools import lru_cache
+# google-re2 matches in linear time with a DFA, Use it for timespans if it's
+# installed; It has the same interface as re for what we need. It's kept
+# under its own name, Other regexes shouldn't silently get RE2 semantics.
+try:
+    import re2 as _time_re_mod  # type: ignore[import-not-found]
+except ImportError:
+    import re as _time_re_mod
 
-# A C-style structure to keep .ini style files key=value configs
-@dataclass
-class key_value_struct:
-    key: str
-    value: str
-
-## Systemd unit "key" reference map
-systemd_ref_map = [
-    # We ignore these keys:
-    "Documentation",
-    # We don't provide support for these keys:
-    "Group", # -> Dinit doesn't support setting group along with user
-    # We map systemd things in this order:
-    "Type", # simple -> process
-            # exec -> process
-            # forking -> bgprocess
-            # oneshot -> scripted
-            # notify -> process
-    "Description", # -> A comment at dinit service
-    "Wants", # -> waits-for
-    "Requires", # -> depends-on
-    "Requisite", # -> depends-on
-    "BindsTo", # -> depends-on
-    "PartOf", # -> depends-on
-    "Upholds", # -> waits-for
-    "Before", # -> before
-    "After", # -> after
-    "OnSuccess", # -> chain-to
-    "StartLimitBurst", # -> restart-limit-count
-    "StartLimitIntervalSec", # -> restart-limit-interval
-    "Alias", # -> an another service with depends-on this service
-    "WantedBy", # -> depends-ms
-    "RequiredBy", # -> depends-ms
-    "UpheldBy", # -> depends-ms
-    "PIDFile", # -> pid-file
-    "ExecStart", # -> command
-    "ExecStop", # -> stop-command
-    "TimeoutStartSec", # -> start-timeout, with converting systemd timespans
-    "TimeoutStopSec", # -> stop-timeout, same
-    "TimeoutSec", # -> both: start-timeout, stop-timeout
-    "Restart", # -> restart (with converting some systemd things)
-    "EnvironmentFile", # -> env-file
-    "User", # -> run-as = User
-    "WorkingDirectory", # -> working-dir
-    "LimitCORE", # -> rlimit-core
-    "LimitDATA", # -> rlimit-data
-    "LimitNOFILE", # -> rlimit-nofile
-    "UtmpIdentifier", # -> inittab-line
-    "KillSignal", # -> term-signal
-]
+## Systemd unit "key" reference
+# Supported keys are the ones in HANDLERS (see below), They're mapped this way:
+#   Documentation -> ignored
+#   Group -> run-as = User:Group, Dinit doesn't support setting group without user
+#   Type -> type: simple -> process
+#                 exec -> process
+#                 forking -> bgprocess
+#                 oneshot -> scripted
+#                 notify -> process
+#   Description -> A comment at dinit service
+#   Wants, Upholds -> waits-for
+#   Requires, Requisite, BindsTo, PartOf -> depends-on
+#   Before -> before
+#   After -> after
+#   OnSuccess -> chain-to
+#   StartLimitBurst -> restart-limit-count
+#   StartLimitIntervalSec -> restart-limit-interval
+#   Alias -> an another service with depends-on this service
+#   WantedBy, RequiredBy, UpheldBy -> depends-ms
+#   PIDFile -> pid-file
+#   ExecStart -> command
+#   ExecStop -> stop-command
+#   TimeoutStartSec -> start-timeout, with converting systemd timespans
+#   TimeoutStopSec -> stop-timeout, same
+#   TimeoutSec -> both: start-timeout, stop-timeout
+#   Restart -> restart (with converting some systemd things)
+#   EnvironmentFile -> env-file
+#   User -> run-as = User (or User:Group if Group is set)
+#   WorkingDirectory -> working-dir
+#   LimitCORE -> rlimit-core
+#   LimitDATA -> rlimit-data
+#   LimitNOFILE -> rlimit-nofile
+#   UtmpIdentifier -> inittab-line
+#   KillSignal -> term-signal
 
-## List for comments
-comments = [ ]
+## Signal name -> term-signal value map
+# Dinit recognizes these signals by name, others are resolved into their number
+signal_map: dict[str, str | int] = {sig.name.removeprefix('SIG'): sig.value for sig in signal.Signals}
+signal_map.update({name: name for name in (
+    "HUP", "INT", "QUIT", "KILL", "USR1", "USR2", "TERM", "CONT", "STOP", "INFO",
+)})
 
-## Map for input file (systemd unit)
-input_map = [ ]
+## List for comments
+comments: list[str] = [ ]
 
-## Map for output file (dinit service)
-output_map = [ ]
+## Output file (dinit service) lines, written at once when converting is done
+output_parts: list[str] = [ ]
 
-def warning(message):
-    if not args.quiet:
+def warning(message: str) -> None:
+    if not quiet:
         print(f'\nWARN: {message}')
 
-def sub_warning(message, flush):
-    if not args.quiet:
+def sub_warning(message: str, flush: bool) -> None:
+    if not quiet:
         print(f'... {message}')
         if flush:
             print('\n')
 
+## Systemd time unit -> microseconds map
+# Like systemd, Timespans are summed up in microseconds and divided into
+# seconds once, So sub-second values stay exact (9ms -> 0.009)
+time_unit_map = {
+    "": 1000000, # Systemd uses seconds for numbers without unit
+    "μs": 1, "us": 1, "usec": 1,
+    "ms": 1000, "msec": 1000,
+    "s": 1000000, "sec": 1000000, "second": 1000000, "seconds": 1000000,
+    "m": 60000000, "min": 60000000, "minute": 60000000, "minutes": 60000000,
+    "h": 3600000000, "hr": 3600000000, "hour": 3600000000, "hours": 3600000000,
+    "d": 86400000000, "day": 86400000000, "days": 86400000000,
+    "w": 604800000000, "week": 604800000000, "weeks": 604800000000,
+    "M": 2592000000000, "month": 2592000000000, "months": 2592000000000,
+    # ToDo: Throw a warning if result can't be captured in int type var
+    "y": 31536000000000, "year": 31536000000000, "years": 31536000000000,
+}
+
+# Systemd accepts both micro sign (U+00B5) and greek mu (U+03BC) for μs,
+# Normalize them with a translate table so time_unit_map needs one spelling
+time_translate = str.maketrans("\u00b5", "\u03bc")
+
+# Unfortunately, systemd doesn't enforce the use of spaces between
+# different time types, So every (number, unit) pair is matched on its own.
+# Digits are spelled [0-9] since \d is Unicode-aware in re but not in re2,
+# Both backends must accept exactly the same timespans.
+time_regex = _time_re_mod.compile(r'([0-9]+(?:\.[0-9]+)?)\s*([a-zA-Zμ]*)')
+
 # Systemd has a basic syntax for times, such as (5min and 20sec) but
 # we need to convert them into seconds only.
-def parse_time(time):
-    if time.isnumeric():
+# Results are cached since timeouts are often repeated (TimeoutStartSec and
+# TimeoutStopSec usually share a value), a bad timespan is warned about once.
+@lru_cache(maxsize=128)
+def parse_time(time: str) -> str:
+    if time.isascii() and time.isdigit():
         return time
-    sec = 0
-    mem = ""
-    what = ""
-    letter = False # Used for spliting different time types
-    times = [ ]
-    for ch in time:
-        # Unfortunately, systemd doesn't enforce the use of spaces between
-        # different time types, So We need to advanced parsing. Meh
-        # Store systemd times as a list into TIMES list
-        if ch == " ":
-            continue # Skip empty spaces
-        if ch.isnumeric():
-            if not letter:
-                mem += ch
-                continue
-            else:
-                times.append([ what.strip(), mem.strip() ])
-                mem += ch # Here's Next entry
-                what = "" # Reset what for new entry
-                letter = False # Reset letter for new entry
-                continue
-        if ch.isalpha():
-            what += ch
-            letter = True
-    times.append([ what.strip(), mem.strip() ]) # Catch last entry
-    for item in times:
-        match item[0]:
-            case "μs" | "us" | "usec":
-                sec += (float(mem) / 1000000)
-            case "ms" | "msec":
-                sec += (float(mem) / 1000)
-            case "s" | "sec" | "second" | "seconds":
-                sec += float(mem)
-            case "m" | "min" | "minute" | "minutes":
-                sec += (float(mem) * 60)
-            case "h" | "hr" | "hour" | "hours":
-                sec += (float(mem) * 3600)
-            case "d" | "day" | "days":
-                sec += (float(mem) * 86400)
-            case "w" | "week" | "weeks":
-                sec += (float(mem) * 604800)
-            case "M" | "month" | "months":
-                sec += (float(mem) * 2592000)
-            case "y" | "year" | "years":
-                # ToDo: Throw a warning if result can't be captured in int type var
-                sec += (float(mem) * 31536000)
-            case _:
-                warning(f"Can't parse given time: {item[1]} {item[0]}")
-    return sec
+    usec = 0.0
+    normalized = time.translate(time_translate)
+    times = time_regex.findall(normalized)
+    # findall skips anything which isn't a (number, unit) pair, So check
+    # nothing else is left in the timespan
+    if not times or time_regex.sub('', normalized).strip():
+        warning(f"Can't parse given time: {time}")
+    for num, unit in times:
+        mult = time_unit_map.get(unit)
+        if mult is None:
+            warning(f"Can't parse given time: {num} {unit}")
+            continue
+        usec += float(num) * mult
+    # Dinit doesn't accept exponent notation (5e-06), Format the seconds as
+    # fixed-point from the whole microseconds instead of using float repr
+    sec, frac = divmod(round(usec), 1000000)
+    return f'{sec}.{frac:06d}'.rstrip('0') if frac else str(sec)
+
+## Converting handlers
+# Every supported systemd key has a handler in HANDLERS. Handlers take the
+# value of the key and the converting context (see below).
+
+# State shared between handlers while converting a unit
+@dataclass
+class convert_context:
+    key: str = "" # Currently converting key
+    # Systemd can watch the forking process to determine pid in "forking" type
+    # services, but dinit doesn't support this way So PIDFile is mandatory.
+    # You shuold provide a pid-file for forking (bgprocess) services.
+    type_is_forking: bool = False
+    has_pidfile: bool = False
+    # Some systemd services doesn't have type.
+    has_type: bool = False
+    # Dinit sets group along with user (run-as = User:Group), Group may come
+    # after User so run-as line is patched at run_as_index when it does.
+    user: str = ""
+    group: str = ""
+    run_as_index: int = -1
+
+## Systemd key -> dinit setting template, For keys which are copied as-is
+template_map = {
+    "ExecStart": 'command = {}\n',
+    "ExecStop": 'stop-command = {}\n',
+    "StartLimitBurst": 'restart-limit-count = {}\n',
+    "StartLimitIntervalSec": 'restart-limit-interval = {}\n',
+    "EnvironmentFile": 'env-file = {}\n',
+    "WorkingDirectory": 'working-dir = {}\n',
+    "LimitCORE": 'rlimit-core = {}\n',
+    "LimitNOFILE": 'rlimit-nofile = {}\n',
+    "LimitDATA": 'rlimit-data = {}\n',
+    "UtmpIdentifier": 'inittab-line = {}\n',
+}
+
+## Systemd Type -> dinit type setting
+type_map = {
+    "simple": 'type = process\n',
+    "exec": 'type = process\n',
+    "forking": 'type = bgprocess\n',
+    "oneshot": 'type = scripted\n',
+    "notify": 'type = process\n',
+}
+
+## Systemd Restart -> dinit restart setting, Dinit restarts or it doesn't
+restart_map = {
+    "no": 'restart = no\n',
+    "on-success": 'restart = yes\n',
+    "on-failure": 'restart = yes\n',
+    "on-abnormal": 'restart = yes\n',
+    "on-watchdog": 'restart = yes\n',
+    "on-abort": 'restart = yes\n',
+    "always": 'restart = yes\n',
+}
+
+def handle_template(value: str, ctx: convert_context) -> None:
+    output_parts.append(template_map[ctx.key].format(value))
+
+def handle_ignored(value: str, ctx: convert_context) -> None:
+    pass # no-op
+
+def handle_description(value: str, ctx: convert_context) -> None:
+    comments.append(f'# Description: {value}\n')
+
+def handle_type(value: str, ctx: convert_context) -> None:
+    if value == "dbus":
+        print('\'type=dbus\' isn\'t supported by dinit!')
+        os._exit(1)
+    line = type_map.get(value)
+    if not line:
+        warning(f'Unknown service type: {value}, Falling back to process')
+        return
+    output_parts.append(line)
+    if value == "forking":
+        ctx.type_is_forking = True
+    elif value == "notify":
+        warning('''This service use systemd activition protocol
+Please change your service to use a proper ready notification protocol:
+https://skarnet.org/software/s6/notifywhenup.html''')
+    ctx.has_type = True
+
+# Systemd dependency lists are whitespace separated, Emit one setting per unit
+def emit_deps(value: str, setting: str) -> None:
+    output_parts.extend(f'{setting} = {dep}\n' for dep in value.split())
+
+def handle_wants(value: str, ctx: convert_context) -> None:
+    emit_deps(value, 'waits-for')
+
+def handle_requires(value: str, ctx: convert_context) -> None:
+    emit_deps(value, 'depends-on')
+
+def handle_wanted_by(value: str, ctx: convert_context) -> None:
+    emit_deps(value, 'depends-ms')
+
+def handle_before(value: str, ctx: convert_context) -> None:
+    emit_deps(value, 'before')
+    warning('Before in dinit has different functionality over systemd')
+
+def handle_after(value: str, ctx: convert_context) -> None:
+    emit_deps(value, 'after')
+    warning('After in dinit has different functionality over systemd')
+
+def handle_alias(value: str, ctx: convert_context) -> None:
+    # Every alias service has the same content, Encode it once for all of them
+    payload = f'depends-on = {pathlib.Path(args.unitfile).name}.dinit\n'.encode("UTF-8")
+    for alias in value.split():
+        fd = os.open(alias, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, payload)
+        finally:
+            os.close(fd)
+    print('Service unit has \"Alias\", Creating another service for convering that')
+
+def handle_on_success(value: str, ctx: convert_context) -> None:
+    emit_deps(value, 'chain-to')
+
+def handle_pid_file(value: str, ctx: convert_context) -> None:
+    output_parts.append(f'pid-file = {value}\n')
+    ctx.has_pidfile = True
+
+def handle_restart(value: str, ctx: convert_context) -> None:
+    output_parts.append(restart_map.get(value, 'restart = yes\n'))
+
+def handle_timeout(value: str, ctx: convert_context) -> None:
+    if value == "infinity":
+        TIME = "0"
+    else:
+        TIME = parse_time(value)
+    if ctx.key == "TimeoutSec":
+        output_parts.append(f'start-timeout = {TIME}\n')
+        output_parts.append(f'stop-timeout = {TIME}\n')
+    elif ctx.key == "TimeoutStartSec":
+        output_parts.append(f'start-timeout = {TIME}\n')
+    else:
+        output_parts.append(f'stop-timeout = {TIME}\n')
+
+def run_as_line(ctx: convert_context) -> str:
+    return f'run-as = {ctx.user}:{ctx.group}\n' if ctx.group else f'run-as = {ctx.user}\n'
+
+def handle_user(value: str, ctx: convert_context) -> None:
+    ctx.user = value
+    ctx.run_as_index = len(output_parts)
+    output_parts.append(run_as_line(ctx))
+
+def handle_group(value: str, ctx: convert_context) -> None:
+    ctx.group = value
+    if ctx.run_as_index >= 0:
+        output_parts[ctx.run_as_index] = run_as_line(ctx)
+
+def handle_kill_signal(value: str, ctx: convert_context) -> None:
+    SIG = signal_map.get(value.removeprefix('SIG'))
+    if not isinstance(SIG, str):
+        warning(f'{value} isn\'t recognized by Dinit, Trying to resolve it to number')
+    if SIG:
+        sub_warning(f'Resolved to {SIG}', True)
+        output_parts.append(f'term-signal = {SIG}\n')
+    else:
+        sub_warning(f'Cannot resolve specifed signal: {value}', True)
+
+def handle_unknown(value: str, ctx: convert_context) -> None:
+    warning(f'Unknown/Unsupported key: {ctx.key}')
+
+## Systemd key -> handler map
+HANDLERS = {
+    "Documentation": handle_ignored,
+    "Description": handle_description,
+    "Type": handle_type,
+    "Wants": handle_wants,
+    "Upholds": handle_wants,
+    "Requires": handle_requires,
+    "Requisite": handle_requires,
+    "BindsTo": handle_requires,
+    "PartOf": handle_requires,
+    "WantedBy": handle_wanted_by,
+    "RequiredBy": handle_wanted_by,
+    "UpheldBy": handle_wanted_by,
+    "Before": handle_before,
+    "After": handle_after,
+    "Alias": handle_alias,
+    "OnSuccess": handle_on_success,
+    "PIDFile": handle_pid_file,
+    "Restart": handle_restart,
+    "TimeoutStartSec": handle_timeout,
+    "TimeoutStopSec": handle_timeout,
+    "TimeoutSec": handle_timeout,
+    "User": handle_user,
+    "Group": handle_group,
+    "KillSignal": handle_kill_signal,
+    # ToDo: More
+}
+HANDLERS.update(dict.fromkeys(template_map, handle_template))
+
+# Convert every key of the unit as soon as it's parsed, in a single pass.
+# Names used per line are bound to locals first, Local lookups are cheaper
+# than global ones and this loop runs for every line of the unit.
+def convert_unit(readline: Callable[[], bytes], ctx: convert_context) -> None:
+    add_comment = comments.append
+    get_handler = HANDLERS.get
+    unknown = handle_unknown
+    intern = sys.intern
+    for raw in iter(readline, b''):
+        line = raw.decode("UTF-8").rstrip("\r\n")
+        if not line or line[0] == "[":
+            continue # Skip empty lines and sections
+        if line[0] in "#;":
+            add_comment(f'#In systemd service unit comment: {line}\n') # comment
+            continue
+        name, sep, memory = line.partition("=")
+        key = name.strip()
+        if not sep or not key:
+            continue # Ignore blank lines and lines without key=value
+        # Interned keys are identical objects to HANDLERS keys, So
+        # dict lookups match them by identity without comparing strings
+        ctx.key = key = intern(key)
+        get_handler(key, unknown)(memory.strip(), ctx)
 
 ## Parse flags
 parser = argparse.ArgumentParser(
@@ -177,161 +391,46 @@ parser = argparse.ArgumentParser(
 parser.add_argument('unitfile', help="Systemd unit file path")
 parser.add_argument('--quiet', '-q', action='store_true', help="Be quiet about warnings")
 args = parser.parse_args()
+quiet = args.quiet
 
-## Parse systemd unit
-# In this stage, We just parse given unit file into a key "map"
-with open(args.unitfile, "r", encoding="UTF-8") as file:
-    for line in file:
-        name = ""
-        memory = ""
-        if line[0] == "#" or line[0] == ";":
-            comments.append(f'#In systemd service unit comment: {line}') # comment
-        elif line[0] != "[":
-            for ch in line:
-                if ch == "=":
-                    name = memory
-                    memory = ""
-                else:
-                    memory += ch
-            if name: # Ignore empty lines
-                input_map.append(key_value_struct(name.strip(), memory.strip()))
-
-## Actual converting
+## Parse and convert systemd unit
 ## there is where fun begins :)
-# Systemd can watch the forking process to determine pid in "forking" type
-# services, but dinit doesn't support this way So PIDFile is mandatory.
-# You shuold provide a pid-file for forking (bgprocess) services.
-# 0: Isn't bgprocess, 1: Is bgprocess but doesn't have pid-file, 2: correct bgprocess
-is_pidfile = 0
-# Some systemd services doesn't have type.
-has_type = False
-for expr in input_map:
-    if not expr.key in systemd_ref_map:
-        warning(f'Unknown/Unsupported key: {expr.key}')
-        continue
-    match expr.key:
-        case "Documentation":
-            continue # no-op
-        case "Description":
-            comments.append(f'# Description: {expr.value}\n')
-        case "Type":
-            match expr.value:
-                case "simple" | "exec":
-                    output_map.append(key_value_struct('type', expr.value))
-                case "forking":
-                    output_map.append(key_value_struct('type', expr.value))
-                    is_pidfile = 1
-                case "oneshot":
-                    output_map.append(key_value_struct('type', expr.value))
-                case "notify":
-                    output_map.append(key_value_struct('type', 'process'))
-                    warning('''This service use systemd activition protocol
-Please change your service to use a proper ready notification protocol:
-https://skarnet.org/software/s6/notifywhenup.html''')
-                case "dbus":
-                    print('\'type=dbus\' isn\'t supported by dinit!')
-                    os._exit(1)
-            has_type = True
-        case "ExecStart":
-            output_map.append(key_value_struct('command', expr.value))
-        case "ExecStop":
-            output_map.append(key_value_struct('stop-command', expr.value))
-        case "Wants" | "UpHolds":
-            for dep in expr.value.split(" "):
-                output_map.append(key_value_struct('waits-for', dep))
-        case "Requires" | "Requisite" | "BindsTo" | "PartOf":
-            for dep in expr.value.split(" "):
-                output_map.append(key_value_struct('depends-on', dep))
-        case "WantedBy" | "RequiredBy" | "UpheldBy":
-            for dep in expr.value.split(" "):
-                output_map.append(key_value_struct('depends-ms', dep))
-        case "Before":
-            for dep in expr.value.split(" "):
-                output_map.append(key_value_struct('before', dep))
-            warning('Before in dinit has different functionality over systemd')
-        case "After":
-            for dep in expr.value.split(" "):
-                output_map.append(key_value_struct('after', dep))
-            warning('After in dinit has different functionality over systemd')
-        case "Alias":
-            for alias in expr.value.split(" "):
-                with open(alias, "w", encoding="UTF-8") as temp:
-                    temp.write(f'depends-on = {args.unitfile}.dinit\n')
-            print('Service unit has \"Alias\", Creating another service for convering that')
-        case "OnSuccess":
-            for chain in expr.value.split(" "):
-                output_map.append(key_value_struct('chain-to', sdep))
-        case "StartLimitBurst":
-            output_map.append(key_value_struct('restart-limit-count', expr.value))
-        case "StartLimitIntervalSec":
-            output_map.append(key_value_struct('restart-limit-interval', expr.value))
-        case "PIDFile":
-            output_map.append(key_value_struct('pid-file', expr.value))
-            is_pidfile = 2
-        case "EnvironmentFile":
-            output_map.append(key_value_struct('env-file', expr.value))
-        case "Restart":
-            if expr.value == "true" or expr.value == "false":
-                output_map.append(key_value_struct('restart', expr.value))
-        case "TimeoutStartSec" | "TimeoutStopSec" | "TimeoutSec":
-            if expr.value == "infinity":
-                TIME = 0
-            else:
-                TIME = parse_time(expr.value)
-            if expr.value == "TimeoutSec":
-                output_map.append(key_value_struct('start-timeout', TIME))
-                output_map.append(key_value_struct('stop-timeout', TIME))
-            elif "Start" in expr.key:
-                output_map.append(key_value_struct('start-timeout', TIME))
-            else:
-                output_map.append(key_value_struct('stop-timeout', TIME))
-        case "User":
-            STR = f'{expr.value}'
-            output_map.append(key_value_struct('run-as', STR))
-        case "Group":
-            warning('Setting specific group for execution is not support in Dinit')
-            sub_warning('Dinit will use primary group of user', False)
-        case "WorkingDirectory":
-            output_map.append(key_value_struct('working-dir', expr.value))
-        case "LimitCORE":
-            output_map.append(key_value_struct('rlimit-core', expr.value))
-        case "LimitNOFILE":
-            output_map.append(key_value_struct('rlimit-nofile', expr.value))
-        case "LimitDATA":
-            output_map.append(key_value_struct('rlimit-data', expr.value))
-        case "UtmpIdentifier":
-            output_map.append(key_value_struct('inittab-line', expr.value))
-        case "KillSignal":
-            SIG = ""
-            match expr.value.removeprefix('SIG'):
-                case "HUP" | "INT" | "QUIT" | "KILL" | "USR1" | "USR2" | "TERM" | "CONT" | "STOP" | "INFO":
-                    SIG = expr.value.removeprefix('SIG')
-                case _:
-                    warning(f'{expr.value} isn\'t recognized by Dinit, Trying to resolve it to number')
-                    for knownsig in signal.Signals:
-                        if expr.value == knownsig.name:
-                            SIG = knownsig.value
-            if SIG:
-                sub_warning(f'Resolved to {SIG}', True)
-                output_map.append(key_value_struct('term-signal', expr.value))
-            else:
-                sub_warning(f'Cannot resolve specifed signal: {expr.value}', True)
-        case _:
-            print(f'Not implemented key: {expr.key}')
-        # ToDo: More
-
-if not has_type:
-    output_map.append(key_value_struct('type', 'process')) # Default fall-back type
-
-## Writing output_map into target
-with open(pathlib.Path(args.unitfile).name + '.dinit', 'w', encoding="UTF-8") as target:
-    for comment in comments:
-        target.write(comment)
-    for expr in output_map:
-        target.write(f'{expr.key} = {expr.value}\n')
-    if is_pidfile == 1:
-        warning('Service is "forking" type but doesn\'t have any pid-file!, See Usage.md')
-        target.write('# Service is "forking" type but doesn\'t have any pid-file!\n')
+# Regular unit files are mapped read-only and prefaulted (MAP_POPULATE, Linux
+# only) so lines are decoded straight from the page cache without a read() copy.
+# Anything else (pipes, FIFOs, procfs files) has no usable size, Read it normally.
+ctx = convert_context()
+fd = os.open(args.unitfile, os.O_RDONLY)
+try:
+    st = os.fstat(fd)
+    if stat.S_ISREG(st.st_mode) and st.st_size:
+        with mmap.mmap(fd, 0, flags=mmap.MAP_SHARED | getattr(mmap, 'MAP_POPULATE', 0),
+                       prot=mmap.PROT_READ) as file:
+            convert_unit(file.readline, ctx)
+    elif not stat.S_ISREG(st.st_mode):
+        with os.fdopen(fd, 'rb', closefd=False) as stream:
+            convert_unit(stream.readline, ctx)
+finally:
+    os.close(fd)
+
+if ctx.group and not ctx.user:
+    warning('Setting specific group without user for execution is not support in Dinit')
+    sub_warning('Group will be ignored', False)
+if not ctx.has_type:
+    output_parts.append('type = process\n') # Default fall-back type
+
+## Writing comments and output_parts into target
+if ctx.type_is_forking and not ctx.has_pidfile:
+    warning('Service is "forking" type but doesn\'t have any pid-file!, See Usage.md')
+    output_parts.append('# Service is "forking" type but doesn\'t have any pid-file!\n')
+# Output is encoded once and written to a raw fd, without a TextIOWrapper
+out = memoryview(''.join(comments + output_parts).encode("UTF-8"))
+fd = os.open(pathlib.Path(args.unitfile).name + '.dinit', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+try:
+    while out:
+        written = os.write(fd, out) # os.write() may write partially
+        out = out[written:]
+finally:
+    os.close(fd)
 
 print('\nConverting service unit to dinit service is completed.')
 print('It\'s HIGHLY recommended to modify this generated file to fit your needs')